@@ -2,6 +2,7 @@ from setuptools import setup, find_packages
 
 install_requires = [
     # "gurobipy",  # install this manually
+    # "numba",  # optional: speeds up the validation of tree decompositions
     "matplotlib",
     "numpy",
     "click",
@@ -22,8 +22,11 @@
 #
 
 import os
-import sys
 import click
+import functools
+import logging.handlers
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 from . import util
 from . import topology_zoo_reader
@@ -41,50 +44,60 @@ def cli():
 
 import logging
 
-
-def initialize_root_logger(filename, print_level=logging.INFO, file_level=logging.DEBUG, allow_override=False):
-    if not allow_override and filename is not None and os.path.exists(filename):
-        raise ValueError("Attempted to overwrite existing log file:  {}".format(filename))
-    print("Initializing root logger: {}".format(filename))
-    fmt = '%(levelname)-10s %(asctime)s %(lineno)4d:%(name)-32s\t %(message)s'
-    logging.basicConfig(filename=filename,
-                        filemode='w',
-                        level=file_level,
-                        format=fmt)
-
+def _initialize_worker_logging(log_queue, level):
+    # Depending on the start method, workers either inherit copies of the parent's handlers (fork) or have none at
+    # all (spawn, forkserver). Replace them by a QueueHandler, such that the parent writes all records.
     root_logger = logging.getLogger()
-
-    stdout_handler = logging.StreamHandler(sys.stdout)
-    stdout_handler.setLevel(print_level)
-    root_logger.addHandler(stdout_handler)
-    root_logger.info("Initialized Root Logger")
-    return root_logger
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(level)
+
+def _tw_worker(name_graph_pair, validate=False):
+    graph_name, graph = name_graph_pair
+    td = treewidth_model.compute_tree_decomposition(graph)
+    if validate and not td.is_tree_decomposition(graph):
+        raise ValueError("Returned tree decomposition for graph {} is NOT valid!".format(graph_name))
+    return graph_name, td.width
 
 @cli.command()
-def compute_topologyzoo_treewidths():
+@click.option("--validate/--no-validate", default=False, help="Verify each computed tree decomposition.")
+def compute_topologyzoo_treewidths(validate):
     """Computes the treewidth of all contained topology zoo graphs. Stores the output in the output/ folder and the log in log/."""
     util.ExperimentPathHandler.initialize(check_emptiness_log=False, check_emptiness_output=False)
     log_file = os.path.join(util.ExperimentPathHandler.LOG_DIR, "compute_topologyzoo_treewidths.log")
-    logger = initialize_root_logger(log_file, allow_override=True)
+    logger = util.initialize_root_logger(log_file, allow_override=True)
     graph_dictionary = topology_zoo_reader.get_networkx_topology_zoo_graphs()
     tw_dictionary = {}
-    for graph_name, graph in graph_dictionary.items():
-        td = treewidth_model.compute_tree_decomposition(graph)
-        if td.is_tree_decomposition(graph):
-            logger.info("Returned tree decomposition of width {} for graph {} is valid!".format(td.width, graph_name))
-        else:
-            raise ValueError("Returned tree decomposition is NOT valid!")
-        tw_dictionary[graph_name] = td.width
+    # each worker spawns its own tw-exact process, hence only use half of the cores
+    max_workers = max(1, (os.cpu_count() or 1) // 2)
+    # the workers send their log records to the parent, which passes them on to the root logger's handlers
+    mp_context = multiprocessing.get_context()
+    log_queue = mp_context.Queue()
+    log_listener = logging.handlers.QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    log_listener.start()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=mp_context,
+                                 initializer=_initialize_worker_logging,
+                                 initargs=(log_queue, logger.level)) as executor:
+            for graph_name, width in executor.map(functools.partial(_tw_worker, validate=validate), graph_dictionary.items()):
+                if validate:
+                    logger.info("Returned tree decomposition of width {} for graph {} is valid!".format(width, graph_name))
+                else:
+                    logger.info("Returned tree decomposition of width {} for graph {}.".format(width, graph_name))
+                tw_dictionary[graph_name] = width
+    finally:
+        log_listener.stop()
 
     output_file = os.path.join(util.ExperimentPathHandler.OUTPUT_DIR,"topologyzoo_treewidths.txt")
 
     logger.info("Writing resuling treewidths to {}".format(output_file))
     with open(output_file, "w") as f:
         f.write("#{:20s}\t{:>10s}\t{:>10s}\t{:>10s}\n".format("graph_name", "nodes", "edges", "treewidth"))
-        for graph_name in sorted(list(graph_dictionary.keys())):
-            graph = graph_dictionary[graph_name]
-            number_nodes = len(graph.nodes)
-            number_edges = len(graph.edges)
+        for graph_name, graph in sorted(graph_dictionary.items()):
+            number_nodes = graph.n_nodes
+            number_edges = graph.n_edges
             treewidth = tw_dictionary[graph_name]
             f.write("{:21s}\t{:10d}\t{:10d}\t{:10d}\n".format(graph_name, number_nodes, number_edges, treewidth))
 
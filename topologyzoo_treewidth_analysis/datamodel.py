@@ -21,7 +21,7 @@
 # SOFTWARE.
 #
 
-from collections import defaultdict
+from collections import defaultdict, deque
 import random
 import numpy as np
 import networkx as nx
@@ -41,7 +41,24 @@ class UndirectedGraph(object):
         self.neighbors = {}
         self.incident_edges = {}
 
+        self._n_nodes = 0
+        self._n_edges = 0
+
+        self._csr = None  # (indptr, neighbors_flat) as computed by freeze(); discarded on modification
+        self._csr_id = None  # map nodes to their index in the CSR arrays
+
+    @property
+    def n_nodes(self):
+        return self._n_nodes
+
+    @property
+    def n_edges(self):
+        return self._n_edges
+
     def add_node(self, node):
+        self._csr = None
+        if node not in self.nodes:
+            self._n_nodes += 1
         self.nodes.add(node)
         self.neighbors[node] = set()
         self.incident_edges[node] = set()
@@ -49,12 +66,16 @@ class UndirectedGraph(object):
     def add_edge(self, i, j):
         if i not in self.nodes or j not in self.nodes:
             raise ValueError("Node not in graph!")
-        new_edge = frozenset([i, j])
-        if new_edge in self.edges:
+        new_edge = (i, j) if i <= j else (j, i)
+        is_duplicate = new_edge in self.edges
+        if is_duplicate:
             global_logger.warning("Duplicate edge {}. Ignoring it!".format(new_edge))
-        if len(new_edge) == 1:
+        if i == j:
             global_logger.warning("Loop edges are not allowed ({},{}). Not adding the edge!".format(i,j))
             return None
+        if not is_duplicate:
+            self._n_edges += 1
+            self._csr = None
 
         self.neighbors[i].add(j)
         self.neighbors[j].add(i)
@@ -69,16 +90,17 @@ class UndirectedGraph(object):
 
         edges_to_remove = list(self.incident_edges[node])
 
-        for incident_edge in edges_to_remove:
-            edge_as_list = list(incident_edge)
-            self.remove_edge(edge_as_list[0], edge_as_list[1])
+        for (i, j) in edges_to_remove:
+            self.remove_edge(i, j)
 
         del self.incident_edges[node]
         del self.neighbors[node]
         self.nodes.remove(node)
+        self._n_nodes -= 1
+        self._csr = None
 
     def remove_edge(self, i, j):
-        old_edge = frozenset([i, j])
+        old_edge = (i, j) if i <= j else (j, i)
         if i not in self.nodes or j not in self.nodes:
             raise ValueError("Nodes not in graph!")
         if old_edge not in self.edges:
@@ -91,6 +113,8 @@ class UndirectedGraph(object):
         self.incident_edges[j].remove(old_edge)
 
         self.edges.remove(old_edge)
+        self._n_edges -= 1
+        self._csr = None
 
     def get_incident_edges(self, node):
         return self.incident_edges[node]
@@ -98,6 +122,33 @@ class UndirectedGraph(object):
     def get_neighbors(self, node):
         return self.neighbors[node]
 
+    def freeze(self):
+        ''' compiles the adjacency structure into CSR arrays: the neighbors of the node with index i are
+        neighbors_flat[indptr[i]:indptr[i+1]], where nodes are indexed according to their sorted order.
+        The arrays are discarded again when the graph is modified.
+        '''
+        sorted_nodes = sorted(self.nodes)
+        self._csr_id = {node: idx for (idx, node) in enumerate(sorted_nodes)}
+        indptr = np.zeros(len(sorted_nodes) + 1, dtype=np.int64)
+        neighbors_flat = np.empty(2 * self._n_edges, dtype=np.int64)
+        pos = 0
+        for idx, node in enumerate(sorted_nodes):
+            for neighbor_id in sorted(self._csr_id[neighbor] for neighbor in self.neighbors[node]):
+                neighbors_flat[pos] = neighbor_id
+                pos += 1
+            indptr[idx + 1] = pos
+        self._csr = (indptr, neighbors_flat)
+
+    def neighbors_csr(self):
+        if self._csr is None:
+            self.freeze()
+        return self._csr
+
+    def get_csr_index(self, node):
+        if self._csr is None:
+            self.freeze()
+        return self._csr_id[node]
+
     def get_edge_representation(self):
         return [list(edge) for edge in self.edges]
 
@@ -105,17 +156,15 @@ class UndirectedGraph(object):
         if len(self.nodes) == 0:
             return True
         root = next(iter(self.nodes))
-        unvisited = set(self.nodes)
-        to_process = [root]
-        while len(to_process) > 0:
-            current_node = to_process.pop(0)
-            if not current_node in unvisited:
-                continue
+        visited = {root}
+        to_process = deque([root])
+        while to_process:
+            current_node = to_process.popleft()
             for neighbor in self.neighbors[current_node]:
-                if neighbor in unvisited:
+                if neighbor not in visited:
+                    visited.add(neighbor)
                     to_process.append(neighbor)
-            unvisited.remove(current_node)
-        return len(unvisited) == 0
+        return len(visited) == len(self.nodes)
 
     def __str__(self):
         return "{} {} with following attributes: \n\t\tNodes{}\n\t\tEdges{}".format(type(self).__name__, self.name,
@@ -22,9 +22,9 @@
 #
 
 import networkx as nx
-import glob
 import os
-import pkg_resources
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 
 from . import util, datamodel
 
@@ -32,45 +32,96 @@ import numpy.random
 
 global_logger = util.get_logger(__name__, make_file=False, propagate=True)
 
-DATA_PATH = pkg_resources.resource_filename("topologyzoo_treewidth_analysis", "data/")
+try:
+    from importlib.resources import files
+    DATA_DIR = files("topologyzoo_treewidth_analysis").joinpath("data")
+except ImportError:  # Python < 3.9
+    import pathlib
+    DATA_DIR = pathlib.Path(__file__).parent.joinpath("data")
+
+DATA_PATH = str(DATA_DIR)
+CACHE_FILE = DATA_PATH + "/topologyZoo.cache.pkl"
+CACHE_VERSION = 3  # increment whenever the pickled graph representation changes
 
 def get_networkx_topology_zoo_graphs():
-    network_files = glob.glob(DATA_PATH  + "/topologyZoo/*.gml")
-    consider_disconnected = True
+    network_files = [p for p in DATA_DIR.joinpath("topologyZoo").iterdir() if p.name.endswith(".gml")]
+
+    cached_result = _read_cache(network_files)
+    if cached_result is not None:
+        return cached_result
 
     result = {} #will be a map of graph name to networkx graph
 
-    for net_file in network_files:
-        # Extract name of network from file path
-        path, filename = os.path.split(net_file)
-        network_name = os.path.splitext(filename)[0]
-
-        graph = None
-        try:
-            global_logger.info("reading file {}".format(net_file))
-            try:
-                graph = nx.read_gml(net_file, label="id")
-            except Exception as ex:
-                if "duplicated" in str(ex) and "multigraph 1" in str(ex):
-                    global_logger.warning("Multigraph detected; fixing the problem...")
-                    with open(net_file, "r") as f:
-                        graph_source = f.read()
-                    graph_source = graph_source.replace("graph [", "graph [\n  multigraph 1")
-                    graph = nx.parse_gml(graph_source, label="id")
-                    global_logger.warning("\ttried to fix the multigraph issue")
-
-            if graph is not None:
-                undir_nx_graph = graph.to_undirected()
-                undir_graph = datamodel.get_undirected_graph_from_networkx_graph(undir_nx_graph, network_name)
-                global_logger.info("Successfully read graph {}".format(net_file))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for network_name, undir_graph in executor.map(_load_one, network_files):
+            if undir_graph is not None:
                 result[network_name] = undir_graph
-            else:
-                raise RuntimeError("Unsuccessful in reading graph {}".format(net_file))
 
-        except Exception as ex:
-            import traceback
-            global_logger.error("reading file {} was NOT sucessful! \n\n\n".format(net_file))
-            global_logger.error("{}\n\n\n".format(str(ex)))
-            traceback.print_exc()
+    if len(result) == len(network_files):
+        _write_cache(_get_network_names(network_files), result)
+
+    return result
+
+
+def _get_network_names(network_files):
+    return frozenset(os.path.splitext(f.name)[0] for f in network_files)
+
+
+def _read_cache(network_files):
+    try:
+        if os.path.getmtime(CACHE_FILE) <= max(os.path.getmtime(f) for f in network_files):
+            return None
+        with open(CACHE_FILE, "rb") as f:
+            cache_version, network_names, result = pickle.load(f)
+        if cache_version != CACHE_VERSION:
+            return None
+        # files may have been added or removed without changing the modification times of the remaining ones
+        if network_names != _get_network_names(network_files):
+            return None
+        global_logger.info("Read {} graphs from cache {}".format(len(result), CACHE_FILE))
+        return result
+    except Exception as ex:
+        # missing or corrupt caches are simply rebuilt
+        global_logger.debug("Not using cache {}: {}".format(CACHE_FILE, ex))
+        return None
+
+
+def _write_cache(network_names, result):
+    try:
+        with open(CACHE_FILE, "wb") as f:
+            pickle.dump((CACHE_VERSION, network_names, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as ex:
+        global_logger.warning("Could not write cache {}: {}".format(CACHE_FILE, ex))
+
+
+def _load_one(net_file):
+    # Extract name of network from file path
+    network_name = os.path.splitext(net_file.name)[0]
+
+    try:
+        global_logger.info("reading file {}".format(net_file))
+        with open(net_file, "r") as f:
+            lines = f.readlines()
+        if not any(line.split() == ["multigraph", "1"] for line in lines):
+            # networkx rejects duplicated edges unless the graph is declared as multigraph;
+            # duplicates are dropped again when constructing the undirected graph
+            graph_line = next((idx for (idx, line) in enumerate(lines) if line.strip() == "graph ["), None)
+            if graph_line is not None:
+                lines.insert(graph_line + 1, "  multigraph 1\n")
+        graph = nx.parse_gml(lines, label="id")
+
+        if graph is not None:
+            undir_nx_graph = graph.to_undirected()
+            undir_graph = datamodel.get_undirected_graph_from_networkx_graph(undir_nx_graph, network_name)
+            global_logger.info("Successfully read graph {}".format(net_file))
+            return network_name, undir_graph
+        else:
+            raise RuntimeError("Unsuccessful in reading graph {}".format(net_file))
+
+    except Exception as ex:
+        import traceback
+        global_logger.error("reading file {} was NOT sucessful! \n\n\n".format(net_file))
+        global_logger.error("{}\n\n\n".format(str(ex)))
+        traceback.print_exc()
 
-    return result
\ No newline at end of file
+    return network_name, None
@@ -29,10 +29,15 @@ import time
 from heapq import heappush, heappop
 import subprocess
 import enum
-from collections import namedtuple
+from collections import deque, namedtuple
 
 from . import datamodel, util
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 global_logger = util.get_logger(__name__, make_file=False, propagate=True)
 
 
@@ -47,6 +52,10 @@ class TreeDecomposition(datamodel.UndirectedGraph):
         self.node_bag_dict = {}  # map TD nodes to their bags
         self.representative_map = {}  # map graph nodes to representative TD nodes
         self.complete_graph_node_to_tree_node_map = {}
+        self._node_id = {}  # map graph nodes to bit positions in the bag masks
+        self._bag_mask = {}  # map TD nodes to their bags encoded as bitmasks
+        self._max_bag = 0  # size of the largest bag; recomputed lazily if stale
+        self._max_bag_stale = False
 
     def add_node(self, node, node_bag=None):
         ''' adds a node to the tree decomposition and stores the bag information; edges must be created externally.
@@ -62,34 +71,53 @@ class TreeDecomposition(datamodel.UndirectedGraph):
         super(TreeDecomposition, self).add_node(node)
         self.node_bag_dict[node] = node_bag
         # edges_to_create = set()
+        bag_mask = 0
         for req_node in node_bag:
+            if req_node not in self._node_id:
+                self._node_id[req_node] = len(self._node_id)
+            bag_mask |= 1 << self._node_id[req_node]
             if req_node not in self.representative_map:
                 self.representative_map[req_node] = node
             if req_node not in self.complete_graph_node_to_tree_node_map:
-                self.complete_graph_node_to_tree_node_map[req_node] = [node]
+                self.complete_graph_node_to_tree_node_map[req_node] = {node}
             else:
-                self.complete_graph_node_to_tree_node_map[req_node].append(node)
+                self.complete_graph_node_to_tree_node_map[req_node].add(node)
+        self._bag_mask[node] = bag_mask
+        if len(node_bag) > self._max_bag:
+            self._max_bag = len(node_bag)
 
 
     def remove_node(self, node):
-        del self.node_bag_dict[node]
-
-
-        for req_node in self.complete_graph_node_to_tree_node_map.keys():
-            if node in self.complete_graph_node_to_tree_node_map[req_node]:
-                self.complete_graph_node_to_tree_node_map[req_node].remove(node)
-            if self.representative_map[req_node] == node:
-                self.representative_map[req_node] = self.complete_graph_node_to_tree_node_map[req_node][0]
+        bag = self.node_bag_dict.pop(node)
+        del self._bag_mask[node]
+        if len(bag) == self._max_bag:
+            self._max_bag_stale = True
+
+        # only the members of the removed bag can reference the removed TD node
+        for req_node in bag:
+            tree_nodes = self.complete_graph_node_to_tree_node_map[req_node]
+            tree_nodes.remove(node)
+            if not tree_nodes:
+                del self.complete_graph_node_to_tree_node_map[req_node]
+                del self.representative_map[req_node]
+            elif self.representative_map[req_node] == node:
+                self.representative_map[req_node] = next(iter(tree_nodes))
 
         super(TreeDecomposition, self).remove_node(node)
 
     @property
     def width(self):
-        return max(len(bag) for bag in self.node_bag_dict.values()) - 1
+        if self._max_bag_stale:
+            self._max_bag = max(len(bag) for bag in self.node_bag_dict.values())
+            self._max_bag_stale = False
+        return self._max_bag - 1
 
     def get_bag_intersection(self, t1, t2):
         return self.node_bag_dict[t1] & self.node_bag_dict[t2]
 
+    def get_node_mask(self, req_node):
+        return 1 << self._node_id[req_node]
+
     def get_representative(self, req_node):
         if req_node not in self.representative_map:
             raise ValueError("Cannot find representative for unknown node {}!".format(req_node))
@@ -113,50 +141,92 @@ class TreeDecomposition(datamodel.UndirectedGraph):
     def _is_tree(self):
         if not self.nodes:
             return True
-        start_node = next(iter(self.nodes))
-        visited = set()
-        q = {start_node}
-        while q:
-            t = q.pop()
-            visited.add(t)
-            if len(self.get_neighbors(t) & visited) > 1:
-                return False
-            q |= self.get_neighbors(t) - visited
-
-        return visited == set(self.nodes)
+        # a graph on n nodes is a tree iff it is connected and has n - 1 edges
+        return self.n_edges == self.n_nodes - 1 and self.check_connectedness()
 
     def _verify_all_nodes_covered(self, req):
         return set(self.representative_map.keys()) == set(req.nodes)
 
     def _verify_all_edges_covered(self, req):
+        tree_nodes = self.complete_graph_node_to_tree_node_map
         for (i, j) in req.edges:
-            # Check that there is some overlap in the sets of representative nodes:
-            found_covering_bag = False
-            for node_bag in self.node_bag_dict.values():
-                if i in node_bag and j in node_bag:
-                    found_covering_bag = True
-                    break
-            if found_covering_bag:
-                break
+            # Check that some bag contains both end points, i.e. the sets of TD nodes overlap:
+            if i not in tree_nodes or j not in tree_nodes or tree_nodes[i].isdisjoint(tree_nodes[j]):
+                return False
         return True
 
     def _verify_intersection_property(self):
         # Check that subtrees induced by each graph node are connected
+        if numba is not None:
+            indptr, indices, membership = self._get_tree_and_bag_arrays()
+            return _intersection_property_holds(indptr, indices, membership)
         for req_node in self.representative_map:
-            subtree_nodes = {t for (t, bag) in self.node_bag_dict.items() if req_node in bag}
+            req_node_mask = self.get_node_mask(req_node)
             start_node = self.get_representative(req_node)
-            visited = set()
-            q = {start_node}
+            visited = {start_node}
+            q = deque([start_node])
             while q:
-                t = q.pop()
-                visited.add(t)
-                subtree_neighbors = self.get_neighbors(t) & subtree_nodes
-                unvisited_neighbors = (subtree_neighbors - visited)
-                q |= unvisited_neighbors
-            if not visited == subtree_nodes:
+                t = q.popleft()
+                for neighbor in self.get_neighbors(t):
+                    if neighbor not in visited and self._bag_mask[neighbor] & req_node_mask:
+                        visited.add(neighbor)
+                        q.append(neighbor)
+            # visited only contains TD nodes covering req_node, hence comparing sizes suffices
+            if len(visited) != len(self.complete_graph_node_to_tree_node_map[req_node]):
                 return False
         return True
 
+    def _get_tree_and_bag_arrays(self):
+        ''' returns the tree in CSR format (indptr, indices) together with a |T| x |V| bag membership matrix '''
+        indptr, indices = self.neighbors_csr()
+        membership = np.zeros((self.n_nodes, len(self._node_id)), dtype=np.uint8)
+        for t, bag in self.node_bag_dict.items():
+            idx = self.get_csr_index(t)
+            for req_node in bag:
+                membership[idx, self._node_id[req_node]] = 1
+        return indptr, indices, membership
+
+
+def _jit(f):
+    if numba is None:
+        return f
+    return numba.njit(cache=True)(f)
+
+
+@_jit
+def _intersection_property_holds(indptr, indices, membership):
+    n_tree_nodes, n_graph_nodes = membership.shape
+    visited = np.zeros(n_tree_nodes, dtype=np.uint8)
+    stack = np.empty(n_tree_nodes, dtype=np.int64)
+    for v in range(n_graph_nodes):
+        start = -1
+        subtree_size = 0
+        for t in range(n_tree_nodes):
+            visited[t] = 0
+            if membership[t, v]:
+                subtree_size += 1
+                if start < 0:
+                    start = t
+        if start < 0:
+            continue
+        visited[start] = 1
+        stack[0] = start
+        top = 1
+        reached = 1
+        while top > 0:
+            top -= 1
+            t = stack[top]
+            for k in range(indptr[t], indptr[t + 1]):
+                neighbor = indices[k]
+                if not visited[neighbor] and membership[neighbor, v]:
+                    visited[neighbor] = 1
+                    stack[top] = neighbor
+                    top += 1
+                    reached += 1
+        if reached != subtree_size:
+            return False
+    return True
+
 
 """ Computing tree decompositions """
 
@@ -178,7 +248,7 @@ class TreeDecompositionComputation(object):
             self.logger = logger
 
         self.map_nodes_to_numeric_id = None
-        self.map_numeric_id_to_nodes = None
+        self._id_to_node = None  # list indexed by numeric id (ids start at 1)
         self.DEBUG_MODE = False
 
 
@@ -187,72 +257,69 @@ class TreeDecompositionComputation(object):
     def compute_tree_decomposition(self):
         td_alg_input = self._convert_graph_to_td_input_format()
         result = None
-        # There is probably a better way...
-        curr_dir = os.getcwd()
         PACE_TD_ALGORITHM_PATH = os.getenv("PACE_TD_ALGORITHM_PATH")
         if PACE_TD_ALGORITHM_PATH is None:
             raise ValueError("PACE_TD_ALGORITHM_PATH environment variable is not set!")
-        os.chdir(PACE_TD_ALGORITHM_PATH)
+        # resolve relative paths once, as the executable path would otherwise be resolved relative to cwd
+        PACE_TD_ALGORITHM_PATH = os.path.abspath(PACE_TD_ALGORITHM_PATH)
         try:
             self.logger.info("Starting tw-exact on graph {}".format(self.graph.name))
-            p = subprocess.Popen("./tw-exact", stdin=subprocess.PIPE, stdout=subprocess.PIPE, encoding='utf8')
-            stdoutdata, stderrdata = None, None
-            try:
-                stdoutdata, stderrdata = p.communicate(input=td_alg_input, timeout=self.timeout)
-                self.logger.info(".. sending data:\n{}".format(td_alg_input))
-            except subprocess.TimeoutExpired:
-                self.logger.info("Timeout expired when trying to compute tree decomposition. Killing process and discarding potential result.")
-                p.kill()
-                p.communicate()
-            if not stderrdata:
-                self.logger.info(".. receiving tree decomposition:\n{}".format(stdoutdata))
-                result = self._convert_result_format_to_tree_decomposition(stdoutdata)
-                self.logger.info(".. successfully converted tree decomposition into our own format.")
-
+            # pass cwd instead of changing the working directory of this process
+            completed_process = subprocess.run([os.path.join(PACE_TD_ALGORITHM_PATH, "tw-exact")],
+                                               cwd=PACE_TD_ALGORITHM_PATH,
+                                               input=td_alg_input,
+                                               stdout=subprocess.PIPE,
+                                               encoding='utf8',
+                                               timeout=self.timeout,
+                                               check=True)
+            self.logger.info(".. sending data:\n{}".format(td_alg_input))
+            stdoutdata = completed_process.stdout
+            self.logger.info(".. receiving tree decomposition:\n{}".format(stdoutdata))
+            result = self._convert_result_format_to_tree_decomposition(stdoutdata)
+            self.logger.info(".. successfully converted tree decomposition into our own format.")
+        except subprocess.TimeoutExpired:
+            self.logger.info("Timeout expired when trying to compute tree decomposition. Killed process and discarding potential result.")
         except subprocess.CalledProcessError as e:
             self.logger.error("Subprocess Error: {}".format(e))
             self.logger.error("Return code:      {}".format(e.returncode))
-        finally:
-            os.chdir(curr_dir)
         return result
 
     def _convert_graph_to_td_input_format(self):
-        self.map_nodes_to_numeric_id = {node: str(idx) for (idx, node) in enumerate(sorted(self.graph.nodes), 1)}
-        self.map_numeric_id_to_nodes = {v: k for (k, v) in self.map_nodes_to_numeric_id.items()}
-        lines = ["p tw {} {}".format(len(self.graph.nodes), len(self.graph.edges))]
-        for edge in sorted(self.graph.edges):
-            i, j = edge
-            lines.append("{} {}".format(
-                self.map_nodes_to_numeric_id[i],
-                self.map_nodes_to_numeric_id[j],
-            ))
+        sorted_nodes = sorted(self.graph.nodes)
+        self.map_nodes_to_numeric_id = {node: str(idx) for (idx, node) in enumerate(sorted_nodes, 1)}
+        self._id_to_node = [None] + sorted_nodes
+        node_ids = self.map_nodes_to_numeric_id
+        td_alg_input = "\n".join(itertools.chain(
+            ["p tw {} {}".format(len(self.graph.nodes), len(self.graph.edges))],
+            ("{} {}".format(node_ids[i], node_ids[j]) for (i, j) in sorted(self.graph.edges)),
+        ))
         if self.DEBUG_MODE:
             with open("pace_graph.txt", "w") as f:
-                f.write("\n".join(lines))
+                f.write(td_alg_input)
                 f.write("{}".format(self.map_nodes_to_numeric_id))
-                f.write("{}".format(self.map_numeric_id_to_nodes))
-        return "\n".join(lines)
+                f.write("{}".format(self._id_to_node))
+        return td_alg_input
 
     def _convert_result_format_to_tree_decomposition(self, computation_stdout):
-        lines = computation_stdout.split("\n")
         td = TreeDecomposition("{}_TD".format(self.graph.name))
-        for line in lines[1:]:
-            line = [w.strip() for w in line.split() if w]
-            if not line or line[0] == "c":  # ignore empty and comment lines
+        get_node = self._id_to_node.__getitem__
+        td_edges = []
+        for line in computation_stdout.splitlines():
+            tokens = line.split()
+            if not tokens or tokens[0] == "c" or tokens[0] == "s":  # ignore empty, comment and solution lines
                 continue
-            elif line[0] == "b":
-                bag_id = self._get_bagid(line[1])
-                bag = frozenset([
-                    self.map_numeric_id_to_nodes[i] for i in line[2:]
-                ])
-                td.add_node(bag_id, node_bag=bag)
+            elif tokens[0] == "b":
+                bag = frozenset(map(get_node, map(int, tokens[2:])))
+                td.add_node(self._get_bagid(tokens[1]), node_bag=bag)
             else:
-                assert len(line) == 2
-                i, j = line
-                td.add_edge(
-                    self._get_bagid(i),
-                    self._get_bagid(j),
-                )
+                assert len(tokens) == 2
+                td_edges.append(tokens)
+        # edges are only added once all bags are known
+        for i, j in td_edges:
+            td.add_edge(
+                self._get_bagid(i),
+                self._get_bagid(j),
+            )
         return td
 
     def _get_bagid(self, numeric_id):
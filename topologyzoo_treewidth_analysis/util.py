@@ -21,15 +21,29 @@
 # SOFTWARE.
 #
 
+import atexit
 import collections
 import logging
+import logging.handlers
 import os
 import shutil
+import stat
 import sys
 import time
-from random import Random
+import zlib
 
-random = Random("_util")
+import numpy as np
+
+# fixed seed, such that the default graphviz colors are reproducible across runs
+_color_rng = np.random.default_rng(zlib.crc32(b"_util"))
+
+# our log format uses neither thread nor process information, hence do not collect it for every record
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+_LOG_FORMAT = '%(levelname)-10s %(asctime)s %(lineno)4d:%(name)-32s\t %(message)s'
+_FORMATTER = logging.Formatter(fmt=_LOG_FORMAT)
 
 
 class DeploymentError(Exception): pass
@@ -86,34 +100,41 @@ class ExperimentPathHandler(object):
         ExperimentPathHandler.LOG_DIR = os.path.join(ExperimentPathHandler.EXPERIMENT_DIR , "log")
         ExperimentPathHandler.OUTPUT_DIR = os.path.join(ExperimentPathHandler.EXPERIMENT_DIR, "output")
 
-        _experiment_paths = {ExperimentPathHandler.LOG_DIR,
-                             ExperimentPathHandler.OUTPUT_DIR}
-
-        # Check that all experiment paths exist:
-        if not all(os.path.exists(p) for p in _experiment_paths):
-            raise PathError("Path(s) do not exist:\n    " + "\n   ".join(
-                p for p in _experiment_paths if not os.path.exists(p)
-            ))
-
-        # Check that all of these paths are proper directories
-        if not all(os.path.isdir(p) for p in _experiment_paths):
-            raise PathError("Could not find path(s):\n    " + "\n   ".join(
-                p for p in _experiment_paths if not os.path.isdir(p)
-            ))
-
-        # Check that output & log folders are empty, to avoid overwriting previous results:
-        if check_emptiness_output and not ExperimentPathHandler._is_empty(ExperimentPathHandler.OUTPUT_DIR):
-            raise PathError("Experiment output path is not empty: {}".format(
-                ExperimentPathHandler.OUTPUT_DIR
-            ))
-        if check_emptiness_log and not ExperimentPathHandler._is_empty(ExperimentPathHandler.LOG_DIR):
-            raise PathError("Experiment log path is not empty: {}".format(
-                ExperimentPathHandler.LOG_DIR
-            ))
+        # experiment paths together with their name and whether they must be empty, to avoid overwriting previous results
+        _experiment_paths = ((ExperimentPathHandler.LOG_DIR, "LOG_DIR", check_emptiness_log),
+                             (ExperimentPathHandler.OUTPUT_DIR, "OUTPUT_DIR", check_emptiness_output))
+
+        # Check that all experiment paths exist, are proper directories and, if required, are empty
+        errors = []
+        for p, name, check_emptiness in _experiment_paths:
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                errors.append("{} does not exist: {}".format(name, p))
+                continue
+            if not stat.S_ISDIR(st.st_mode):
+                errors.append("{} is not a directory: {}".format(name, p))
+            elif check_emptiness and not ExperimentPathHandler._is_empty(p):
+                errors.append("{} is not empty: {}".format(name, p))
+        if errors:
+            raise PathError("Invalid experiment path(s):\n    " + "\n    ".join(errors))
 
     @staticmethod
     def _is_empty(path):
-        return len(os.listdir(path)) == 0
+        with os.scandir(path) as it:
+            return next(it, None) is None
+
+    @staticmethod
+    def _contains_log_and_output(path):
+        needed = {"log", "output"}
+        found = set()
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name in needed:
+                    found.add(entry.name)
+                    if found == needed:
+                        return True
+        return False
 
     @staticmethod
     def _get_experiment_dir():
@@ -123,121 +144,168 @@ class ExperimentPathHandler(object):
             experiment_dir = os.getenv("EXPERIMENT_HOME")
         else:
             log.info("EXPERIMENT_HOME environment variable not found")
-            potential_exp_dir = os.getcwd()
-            print("current dir: {}".format(potential_exp_dir))
-            parent = None
-            iterations = 0
-            while potential_exp_dir and potential_exp_dir != parent:
-                parent = os.path.split(potential_exp_dir)[0]
-                print("current dir: {}, parent: {}".format(potential_exp_dir, parent))
-                print("{}".format(set(os.listdir(potential_exp_dir))))
-                if ({"log", "output"}.issubset(set(os.listdir(potential_exp_dir)))):
+            current_dir = os.path.abspath(os.getcwd())
+            log.debug("current dir: %s", current_dir)
+            # check the current directory and then all of its ancestors, without repeatedly splitting paths
+            parts = current_dir.split(os.sep)
+            debug_enabled = log.isEnabledFor(logging.DEBUG)
+            for i in range(len(parts), 0, -1):
+                potential_exp_dir = os.sep.join(parts[:i]) or os.sep
+                if debug_enabled:
+                    log.debug("checking potential experiment dir: %s", potential_exp_dir)
+                try:
+                    contains_log_and_output = ExperimentPathHandler._contains_log_and_output(potential_exp_dir)
+                except OSError:
+                    continue
+                if contains_log_and_output:
                     log.info("Setting experiment path according to first parent containing only input, log, output and sca folders")
                     experiment_dir = potential_exp_dir
                     break
-                iterations += 1
-                potential_exp_dir = parent
-
-                if iterations >= 100:
-                    raise PathError("Exceeded iterations {}".format(iterations))
 
         if experiment_dir is None or not os.path.isdir(experiment_dir):
             raise PathError("Invalid experiment root path: {}".format(experiment_dir))
 
-        log.info("Experiment Home root dir:       {}".format(experiment_dir))
+        log.info("Experiment Home root dir:       %s", experiment_dir)
         return os.path.abspath(experiment_dir)
 
+# set the environment variable TZ_QUIET to silence the PrintLogger
+PRINT_LOGGER_ENABLED = not os.environ.get("TZ_QUIET")
+
+
+def _print_line(message):
+    # sys.stdout is looked up on every call, such that redirections of stdout are respected
+    if PRINT_LOGGER_ENABLED:
+        sys.stdout.write("{}\n".format(message))
+
+
 class PrintLogger(object):
     @staticmethod
     def debug(message, *args, **kwargs):
-        print(message)
+        _print_line(message)
 
     @staticmethod
     def info(message, *args, **kwargs):
-        print(message)
+        _print_line(message)
 
     @staticmethod
     def warning(message, *args, **kwargs):
-        print(message)
+        _print_line(message)
 
     @staticmethod
     def error(message, *args, **kwargs):
-        print(message)
+        _print_line(message)
 
     @staticmethod
     def critical(message, *args, **kwargs):
-        print(message)
+        _print_line(message)
 
     @staticmethod
     def log(message, *args, **kwargs):
-        print(message)
+        _print_line(message)
 
+    @staticmethod
+    def isEnabledFor(level):
+        return PRINT_LOGGER_ENABLED
 
 
-def initialize_root_logger(filename, print_level=logging.INFO, file_level=logging.DEBUG, allow_override=False):
-    if not allow_override and filename is not None and os.path.exists(filename):
+
+def make_log_file_handler(filename, allow_override=False):
+    ''' returns a FileHandler writing to filename; existence check and opening are done in a single system call '''
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if allow_override else os.O_EXCL)
+    try:
+        fd = os.open(filename, flags, 0o644)
+    except FileExistsError:
         raise PathError("Attempted to overwrite existing log file:  {}".format(filename))
+    file_handler = logging.FileHandler(filename, mode="w", delay=True)
+    file_handler.stream = os.fdopen(fd, "w")
+    return file_handler
+
+
+def buffer_log_handler(handler, level):
+    ''' wraps the handler into a MemoryHandler writing records in batches; ERROR records are written immediately.
+
+    When debugging interactively, i.e. DEBUG records are logged and stdout is a terminal, the handler is not wrapped.
+    '''
+    if level <= logging.DEBUG and sys.stdout.isatty():
+        return handler
+    buffered_handler = logging.handlers.MemoryHandler(capacity=1024,
+                                                      flushLevel=logging.ERROR,
+                                                      target=handler,
+                                                      flushOnClose=True)
+    buffered_handler.setLevel(level)
+    atexit.register(buffered_handler.flush)
+    return buffered_handler
+
+
+def initialize_root_logger(filename, print_level=logging.INFO, file_level=logging.DEBUG, allow_override=False):
     print("Initializing root logger: {}".format(filename))
-    fmt = '%(levelname)-10s %(asctime)s %(lineno)4d:%(name)-32s\t %(message)s'
-    logging.basicConfig(filename=filename,
-                        filemode='w',
-                        level=file_level,
-                        format=fmt)
 
     root_logger = logging.getLogger()
-
-    # # This code breaks in weird ways:
-    # file_handler = logging.FileHandler(filename, mode="w")
-    # file_handler.setLevel(file_level)
-    # file_handler.setFormatter(fmt)
-    # root_logger.addHandler(file_level)
+    if filename is not None:
+        file_handler = make_log_file_handler(filename, allow_override=allow_override)
+        file_handler.setLevel(file_level)
+        file_handler.setFormatter(_FORMATTER)
+        root_logger.addHandler(buffer_log_handler(file_handler, file_level))
+        root_logger.setLevel(file_level)
+    else:
+        logging.basicConfig(level=file_level, format=_LOG_FORMAT)
 
     stdout_handler = logging.StreamHandler(sys.stdout)
     stdout_handler.setLevel(print_level)
     root_logger.addHandler(stdout_handler)
     root_logger.info("Initialized Root Logger")
+    return root_logger
 
 
 def get_logger_filename(logger_name):
-    return os.path.join(ExperimentPathHandler.LOG_DIR, logger_name + ".log")
+    return f"{ExperimentPathHandler.LOG_DIR}/{logger_name}.log"
 
 def get_logger(logger_name, make_file=True, make_stream=False, print_level=logging.INFO, file_level=logging.DEBUG, propagate=True, allow_override=False):
     logger = logging.getLogger(logger_name)
 
     if len(logger.handlers) == 0:
+        handler_levels = []
         if make_file:
             fname = get_logger_filename(logger_name)
-            if not allow_override and os.path.exists(fname):
-                raise PathError("Attempted to overwrite existing log file:  {}".format(fname))
-            file_handler = logging.FileHandler(fname, mode="w")
+            file_handler = make_log_file_handler(fname, allow_override=allow_override)
             file_handler.setLevel(file_level)
-            formatter = logging.Formatter(fmt='%(levelname)-10s %(asctime)s %(lineno)4d:%(name)-32s\t %(message)s')
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            file_handler.setFormatter(_FORMATTER)
+            logger.addHandler(buffer_log_handler(file_handler, file_level))
+            handler_levels.append(file_level)
         if make_stream:
             stdout_handler = logging.StreamHandler(sys.stdout)
             stdout_handler.setLevel(print_level)
             logger.addHandler(stdout_handler)
+            handler_levels.append(print_level)
+        if handler_levels:
+            # records below the level of all own handlers are discarded before being created
+            logger.setLevel(min(handler_levels))
         logger.propagate = propagate
-        logger.debug("Created logger {}".format(logger_name))
+        logger.debug("Created logger %s", logger_name)
 
     return logger
 
 
+def _format_args(args, kwargs):
+    arg_strings = [str(arg) for arg in args]
+    arg_strings.extend("{}={}".format(key, arg) for key, arg in kwargs.items())
+    return ", ".join(arg_strings)
+
+
 def log_start_and_end_of_function(logger=PrintLogger, start_message="Start: {f}({args})", end_message="End:   {f}({args}) after {t} s."):
+    need_args = "{args}" in start_message or "{args}" in end_message
+
     def decorator(f):
         def log_start_end(*args, **kwargs):
-            arg_string = ""
-            if "{args}" in start_message:
-                arg_string = ", ".join(str(arg) for arg in args)
-                if kwargs:
-                    arg_string += ", "
-                    arg_string += ", ".join("{}={}".format(key, arg) for key, arg in kwargs.iteritems())
+            if not logger.isEnabledFor(logging.INFO):
+                return f(*args, **kwargs)
+            # stringifying the arguments may be expensive, hence only do it if required
+            arg_string = _format_args(args, kwargs) if need_args else ""
             logger.info(start_message.format(f=f.__name__, args=arg_string))
-            start_time = time.time()
+            start_time = time.perf_counter()
             result = f(*args, **kwargs)
 
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
             logger.info(end_message.format(f=f.__name__, args=arg_string, t=duration))
             return result
 
@@ -246,8 +314,11 @@ def log_start_and_end_of_function(logger=PrintLogger, start_message="Start: {f}(
     return decorator
 
 
+_NUMBER_TYPES = (int, float)
+
+
 def check_percentage(value, none_allowed=True):
-    if none_allowed and value is None:
+    if value is None and none_allowed:
         return
     if not isinstance(value, float):
         raise TypeError("Expected float, got value of type {}".format(type(value)))
@@ -256,34 +327,34 @@ def check_percentage(value, none_allowed=True):
 
 
 def check_positive(value, none_allowed=True):
-    if none_allowed and value is None:
+    if value is None and none_allowed:
         return
-    if not isinstance(value, (int, long, float)):
+    if type(value) is bool or not isinstance(value, _NUMBER_TYPES):  # bool is a subclass of int
         raise TypeError("Expected number, got {}".format(type(value)))
     if value < 0.0:
         raise RangeError("Expected positive number, got {}".format(value))
 
 
 def check_int(value, none_allowed=True):
-    if none_allowed and value is None:
+    if value is None and none_allowed:
         return
-    if not isinstance(value, int):
-        raise Exception("Bad Type")
+    if type(value) is bool or not isinstance(value, int):  # bool is a subclass of int
+        raise TypeError("Expected int, got {}".format(type(value)))
     if value < 0:
-        raise Exception("Bad Type")
+        raise RangeError("Expected non-negative int, got {}".format(value))
 
 
 def check_within_range(value, min, max, none_allowed=True):
-    if none_allowed and value is None:
+    if value is None and none_allowed:
         return
-    if not isinstance(value, (int, float)):
+    if type(value) is bool or not isinstance(value, _NUMBER_TYPES):  # bool is a subclass of int
         raise TypeError("Expected number, got {}".format(type(value)))
     if not min <= value <= max:
         raise RangeError("Expected number within range {} - {}, got {}".format(min, max, value))
 
 
 def check_bool(value, none_allowed=True):
-    if none_allowed and value is None:
+    if value is None and none_allowed:
         return
     if not isinstance(value, bool):
         raise TypeError("Expected boolean, got {}".format(type(value)))
@@ -293,14 +364,20 @@ def approx_equal(x, y, accuracy=0.0001):
     return abs(x - y) < accuracy
 
 
+_OBJ_BOUND_THRESHOLD = 1e99
+_INFINITE_GAP = 1e100
+
+
 def get_obj_gap(objective, bound):
-    if objective < -10 ** 99 or bound > 10 ** 99:
-        return 10.0 ** 100
-    if objective != 0:
-        return abs(abs(bound) - abs(objective)) / abs(objective)
-    if abs(bound - objective) < 0.0001:
+    if objective < -_OBJ_BOUND_THRESHOLD or bound > _OBJ_BOUND_THRESHOLD:
+        return _INFINITE_GAP
+    abs_objective = abs(objective)
+    if abs_objective:
+        return abs(abs(bound) - abs_objective) / abs_objective
+    # the objective is 0 here
+    if abs(bound) < 0.0001:
         return 0.0
-    return 10.0 ** 100
+    return _INFINITE_GAP
 
 
 def get_graph_viz_string(graph, directed=True, get_edge_style=lambda e: ""):
@@ -313,12 +390,10 @@ def get_graph_viz_string(graph, directed=True, get_edge_style=lambda e: ""):
         graphviz_lines.append("graph {} {{".format(graph.name))
         edge_symbol = "--"
 
-    for node in graph.nodes:
-        graphviz_lines.append("{} ;".format(node))
+    graphviz_lines.extend(f"{node} ;" for node in graph.nodes)
 
-    for edge in sorted(graph.edges):
-        n1, n2 = edge
-        graphviz_lines.append("  {} {} {} [{}];".format("\"{}\"".format(n1), edge_symbol, "\"{}\"".format(n2), get_edge_style((n1, n2))))
+    graphviz_lines.extend(f'  "{n1}" {edge_symbol} "{n2}" [{get_edge_style((n1, n2))}];'
+                          for (n1, n2) in sorted(graph.edges))
     graphviz_lines.append("}\n")
     gv = "\n".join(graphviz_lines)
     return gv
@@ -326,14 +401,17 @@ def get_graph_viz_string(graph, directed=True, get_edge_style=lambda e: ""):
 
 def graph_viz_edge_color_according_to_request_list(edge_set_list, colors=None):
     if colors is None:
-        colors = ["\"#{:02x}{:02x}{:02x}\"".format(random.randrange(256),
-                                                   random.randrange(256),
-                                                   random.randrange(256))
-                  for _ in edge_set_list]
+        rgb_values = _color_rng.integers(0, 256, size=(len(edge_set_list), 3), dtype=np.uint8).tolist()
+        colors = [f'"#{r:02x}{g:02x}{b:02x}"' for (r, g, b) in rgb_values]
+
+    # map each edge to the index of the first edge set containing it
+    edge_to_index = {}
+    for index, edges in enumerate(edge_set_list):
+        for e in edges:
+            edge_to_index.setdefault(e, index)
 
     def inner(e):
-        set_list_index = edge_set_list.index(next(edges for edges in edge_set_list if e in edges))
-        return "color={}".format(colors[set_list_index])
+        return "color={}".format(colors[edge_to_index[e]])
 
     return inner
 